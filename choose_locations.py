@@ -6,10 +6,8 @@ from graphs import CityLocations
 from location import Landmark, Restaurant, Location, Hotel
 import datetime
 
-# changing from datetime weekday to opening_times attribute
-DAY_TRANSLATION = {0: 'Monday', 1: 'Tuesday', 2: 'Wednesday',
-                   3: 'Thursday', 4: 'Friday', 5: 'Saturday',
-                   6: 'Sunday'}
+# changing from datetime weekday to the index of that day in the opening_minutes attribute
+DAY_INDEX = {0: 1, 1: 2, 2: 3, 3: 4, 4: 5, 5: 6, 6: 0}
 
 
 def choose_locations(maps: CityLocations, hotel: Hotel, leave: datetime, return_time: datetime)\
@@ -75,8 +73,10 @@ def find_open_locations(start: Location, maps: CityLocations, distance: int,
     start_v = maps.get_vertex(start)
     neighbours = start_v.neighbours
 
-    # what day it is right now
-    day = DAY_TRANSLATION[starting_time.weekday()]
+    # what day it is right now, and the start and end of the timeslot in minutes since midnight
+    day = DAY_INDEX[starting_time.weekday()]
+    start_minute = starting_time.hour * 60 + starting_time.minute
+    return_minute = return_time.hour * 60 + return_time.minute
 
     # base case
     if distance == 0:
@@ -88,14 +88,12 @@ def find_open_locations(start: Location, maps: CityLocations, distance: int,
         # the root node is a hotel and does not need to be added here, so check neighbours
         for n in neighbours:
             if n not in visited and isinstance(n.location, Landmark):
-                # if there is an attraction adjacent that is open that day
-                if n.location.opening_times[day] is not None:
-                    open_time = n.location.opening_times[day][0]
-                    close_time = n.location.opening_times[day][1]
-                    # if it's open now, add to list
-                    if open_time <= starting_time.time() <= close_time or \
-                            starting_time.time() <= open_time <= return_time.time():
-                        recommended.append(n.location)
+                # if there is an attraction adjacent that is open now, add to list. Closed days
+                # are stored as (-1, -1), which never passes this check
+                open_minute, close_minute = n.location.opening_minutes[day]
+                if open_minute <= start_minute <= close_minute or \
+                        start_minute <= open_minute <= return_minute:
+                    recommended.append(n.location)
 
                 # recurse over the neighbours
                 find_open_locations(n.location, maps, distance - 1,
@@ -4,8 +4,10 @@ transport.
 This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
 """
 from typing import Optional
+from collections import deque
+import math
 from location import Location, SubwayStation
-from graphs import CityLocations, SubwayLines, get_distance
+from graphs import CityLocations, SubwayLines
 
 
 def find_path(chosen_locations: list[Location], city_graph: CityLocations,
@@ -30,17 +32,14 @@ def find_path(chosen_locations: list[Location], city_graph: CityLocations,
         else:
             print(location.name + ' is not close enough to walk to, finding nearest subways...')
             # find subway closest to prev
-            starting_station = find_closest_subway(prev, city_graph, [])
+            starting_station = find_closest_subway(prev, subway_graph)
             print('Closest subway to ' + prev.name + ' is ' + starting_station.name)
             # find subway closest to location
-            end_station = find_closest_subway(location, city_graph, [])
+            end_station = find_closest_subway(location, subway_graph)
             print('Closest subway to ' + location.name + ' is ' + end_station.name)
 
             # find path between those stations
-            # keep track of how far away a certain vertex is
-            distances = {starting_station.name: 0}
-            station_path = find_subway_path(starting_station, end_station, distances, [],
-                                            subway_graph)
+            station_path = find_subway_path(starting_station, end_station, subway_graph)
 
             # the graph should be connected, but throw an exception if something went wrong
             if station_path is None:
@@ -55,119 +54,127 @@ def find_path(chosen_locations: list[Location], city_graph: CityLocations,
     return path
 
 
-def find_closest_subway(location: Location, city_graph: CityLocations, visited: list)\
-        -> SubwayStation:
+def find_closest_subway(location: Location, subway_graph: SubwayLines) -> SubwayStation:
     """Return the subway station that is closest to the given location.
-
-    If there is a subway station adjacent to it, that station is returned. Else, it tries to find
-    the closest subway station to the chosen location.
     """
-    # get neighbours
-    neighbors = city_graph.get_neighbors(location)
-
-    # ACCUMULATORS
-    visited.append(location)
-    potential_closest = []
-
-    for neighbor in neighbors:
-        if neighbor.location not in visited:
-            # if there is an adjacent station, return that
-            if isinstance(neighbor.location, SubwayStation):
-                return neighbor.location
-
-            # collects stations adjacent to neighbours
-            potential_closest.append(find_closest_subway(neighbor.location, city_graph, visited))
-
-    # of these stations, find the closest
-    closest = potential_closest[0]
-    for station in potential_closest:
-        if get_distance(station, location) < get_distance(closest, location):
-            closest = station
+    return subway_graph.get_closest_station(location)
 
-    return closest
 
-
-def find_subway_path(subway1: SubwayStation, subway2: SubwayStation, distances: dict,
-                     visited: list[SubwayStation], subway_graph: SubwayLines)\
+def find_subway_path(subway1: SubwayStation, subway2: SubwayStation, subway_graph: SubwayLines)\
         -> Optional[list[SubwayStation]]:
     """Return the shortest subway route between the given two stations, starting from subway1
-    until subway2. Uses a variation of Dijkstra's shortest path algorithm.
+    until subway2.
+
+    Routes are remembered in subway_graph.route_cache, so asking for the same pair of stations
+    again (in either direction) does not search the subway graph a second time.
 
     Precondition:
         - subway1 in subway_graph.get_all_vertices()
         - subway2 in subway_graph.get_all_vertices()
     """
-    # initialize path
-    path = [subway1]
+    key = (min(subway1.name, subway2.name), max(subway1.name, subway2.name))
+    cache = subway_graph.route_cache
 
-    if subway1 == subway2:
-        return path
-    elif subway_graph.adjacent(subway1, subway2):
-        return path + [subway2]
-    else:
-        # keep track of visited vertices
-        new_visited = visited.copy()
-        new_visited.append(subway1)
+    if key not in cache:
+        cache[key] = bidirectional_bfs(subway1, subway2, subway_graph)
 
-        # update the distances dictionary
-        reassign_distances(distances, subway1, subway2, subway_graph, new_visited)
+    path = cache[key]
+
+    if path is None:
+        return None
+    elif path[0].name == subway1.name:
+        return path.copy()
+    else:
+        return path[::-1]
 
-        # pick the shortest step
-        neighbour_stations = sort_by_distances(subway1, subway_graph, distances)
-        shortest = neighbour_stations.pop()
 
-        rest_of_path = None
+def bidirectional_bfs(subway1: SubwayStation, subway2: SubwayStation, subway_graph: SubwayLines)\
+        -> Optional[list[SubwayStation]]:
+    """Return the shortest subway route between the given two stations, starting from subway1
+    until subway2.
 
-        # keep going until you find a path
-        while rest_of_path is None:
-            # make sure that shortest is not in visited to avoid recursion
-            while shortest in new_visited and len(neighbour_stations) > 0:
-                shortest = neighbour_stations.pop()
+    Since every edge has a weight of 1, this runs a breadth-first search forward from subway1 and
+    backward from subway2 at the same time, stopping once the two searches meet along a shortest
+    route. Return None if there is no path between the two stations.
 
-            # this shouldn't happen but there just in case there was no path
-            if len(neighbour_stations) == 0 and shortest in new_visited:
-                return None
+    Precondition:
+        - subway1 in subway_graph.get_all_vertices()
+        - subway2 in subway_graph.get_all_vertices()
+        - subway_graph has been frozen
+    """
+    if subway1.name == subway2.name:
+        return [subway1]
+
+    # keep track of how far away a certain station is on each side, and how we got there
+    distances_f, distances_b = {subway1.name: 0}, {subway2.name: 0}
+    previous_f, previous_b = {subway1.name: None}, {subway2.name: None}
+    queue_f, queue_b = deque([subway1]), deque([subway2])
+
+    # length of the shortest route found so far, and the station where both searches meet on it
+    best = (math.inf, None)
+
+    while queue_f and queue_b:
+        # the fronts cannot produce anything shorter than the route we already have
+        if distances_f[queue_f[0].name] + distances_b[queue_b[0].name] >= best[0]:
+            break
+
+        # alternate one step on each side
+        for side in ((queue_f, distances_f, previous_f, distances_b),
+                     (queue_b, distances_b, previous_b, distances_f)):
+            found = expand_frontier(*side, subway_graph)
+            if found[0] < best[0]:
+                best = found
+
+    if best[1] is None:
+        return None
+
+    # walk back from the meeting station to each end of the route
+    path = []
+    station = best[1]
+    while station is not None:
+        path.append(station)
+        station = previous_f[station.name]
+
+    path.reverse()
+    station = previous_b[best[1].name]
+    while station is not None:
+        path.append(station)
+        station = previous_b[station.name]
 
-            rest_of_path = find_subway_path(shortest, subway2, distances, new_visited, subway_graph)
+    return path
 
-        if rest_of_path is not None:
-            path += rest_of_path
-            return path
-        else:
-            return None
 
+def expand_frontier(queue: deque, distances: dict, previous: dict, other_distances: dict,
+                    subway_graph: SubwayLines) -> tuple:
+    """Visit the next station in queue for one side of bidirectional_bfs.
 
-def reassign_distances(distances: dict, subway1: SubwayStation, subway2: SubwayStation,
-                       subway_graph: SubwayLines, visited: list) -> None:
-    """Updates the distances dictionary to reflect the shortest possible distances between the
-    neighbours of subway and the original location.
+    Return the length of the shortest route found through this station's neighbours that is
+    already known to the other side, along with the station where the two sides meet.
     """
-    # get the actual vertex represented by subway1 and its neighbours
-    subway1_vertex = subway_graph.get_vertex(subway1)
-    neighbours = subway1_vertex.neighbours
+    best = (math.inf, None)
+
+    if not queue:
+        return best
+
+    station = queue.popleft()
+    d = distances[station.name]
 
-    # iterate over the neighbours of subway1 to find the shortest step
-    for u in neighbours:
-        if u.location not in visited:
-            # re-assign distance values
-            if u.item not in distances:
-                distances[u.item] = get_distance(u.location, subway2)
+    for u in subway_graph.get_vertex(station).neighbour_locations:
+        if u.name not in distances:
+            distances[u.name] = d + 1
+            previous[u.name] = station
+            queue.append(u)
 
+        if u.name in other_distances and distances[u.name] + other_distances[u.name] < best[0]:
+            best = (distances[u.name] + other_distances[u.name], u)
 
-def sort_by_distances(subway: SubwayStation, subway_graph: SubwayLines, distances: dict)\
-        -> list:
-    """Return a list of subway stations sorted in descending order by distance from <subway> in
-    edges on the subway_graph."""
-    neighbours = list(subway_graph.get_vertex(subway).neighbours)
-    neighbour_stations = [n.location for n in neighbours]
-    neighbour_stations.sort(reverse=True, key=lambda item: distances[item.name])
-    return neighbour_stations
+    return best
 
 
 if __name__ == "__main__":
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['location', 'graphs'],
+        'extra-imports': ['location', 'graphs', 'collections', 'math'],
         'allowed-io': ['find_path'],  # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
         'disable': ['E1136']
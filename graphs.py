@@ -4,11 +4,16 @@ and the subway lines.
 This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
 """
 from __future__ import annotations
-from typing import Callable, Optional
+from typing import Callable, Iterator, Optional, Union
 from datetime import time
 import math
 import csv
-from location import Location, Landmark, Restaurant, SubwayStation, Hotel
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from location import Location, Landmark, Restaurant, SubwayStation, Hotel, WEEK_DAYS
+
+EARTH_RADIUS = 6371000  # radius of the earth, in meters
 
 
 class _Vertex:
@@ -17,7 +22,10 @@ class _Vertex:
     Instance Attributes:
         - item: refers to the name of the location that this vertex represents
         - location: refers to the actual location object
-        - neighbours: the vertices adjacent to this one
+        - neighbours: the vertices adjacent to this one. This is a set while the graph is being
+            built, and a tuple once the graph is frozen.
+        - neighbour_locations: the locations of the vertices in neighbours, in the same order. This
+            is only filled in once the graph is frozen.
 
     Representation Invariants:
         - self not in self.neighbours
@@ -25,7 +33,8 @@ class _Vertex:
     """
     item: str
     location: Location
-    neighbours: set[_Vertex]
+    neighbours: Union[set[_Vertex], tuple[_Vertex, ...]]
+    neighbour_locations: tuple[Location, ...]
 
     def __init__(self, location: Location) -> None:
         """Initialize a new vertex with the given location.
@@ -35,6 +44,7 @@ class _Vertex:
         self.item = location.name
         self.location = location
         self.neighbours = set()
+        self.neighbour_locations = ()
 
 
 class Graph:
@@ -43,11 +53,28 @@ class Graph:
     #     - _vertices:
     #         A collection of the vertices contained in this graph.
     #         Maps item to _Vertex object.
+    #     - _latitudes:
+    #         The latitude of each vertex's location in radians, in the same order as _vertices.
+    #     - _longitudes:
+    #         The longitude of each vertex's location in radians, in the same order as _vertices.
+    #     - _coordinates:
+    #         _latitudes and _longitudes as numpy arrays, or None if they have not been built since
+    #         the last vertex was added.
+    #     - _frozen:
+    #         Whether freeze has been called, after which no more edges can be added.
     _vertices: dict[str, _Vertex]
+    _latitudes: list[float]
+    _longitudes: list[float]
+    _coordinates: Optional[tuple[np.ndarray, np.ndarray]]
+    _frozen: bool
 
     def __init__(self) -> None:
         """Initialize an empty graph (no vertices or edges)."""
         self._vertices = {}
+        self._latitudes = []
+        self._longitudes = []
+        self._coordinates = None
+        self._frozen = False
 
     def add_vertex(self, location: Location) -> None:
         """Add a vertex with the given item to this graph.
@@ -58,15 +85,22 @@ class Graph:
         if location.name not in self._vertices:
             self._vertices[location.name] = _Vertex(location)
 
+            self._latitudes.append(location.lat_rad)
+            self._longitudes.append(location.lon_rad)
+            self._coordinates = None
+
     def add_edge(self, item1: Location, item2: Location) -> None:
         """Add an edge between the two vertices with the given items in this graph.
 
-        Raise a ValueError if item1 or item2 do not appear as vertices in this graph.
+        Raise a ValueError if item1 or item2 do not appear as vertices in this graph, or if this
+        graph has been frozen.
 
         Preconditions:
             - item1 != item2
         """
-        if item1.name in self._vertices and item2.name in self._vertices:
+        if self._frozen:
+            raise ValueError('Cannot add an edge to a frozen graph')
+        elif item1.name in self._vertices and item2.name in self._vertices:
             v1 = self._vertices[item1.name]
             v2 = self._vertices[item2.name]
 
@@ -80,18 +114,42 @@ class Graph:
 
         Return False if item1 or item2 do not appear as vertices in this graph.
         """
-        if item1.name in self._vertices and item2 .name in self._vertices:
+        if item1.name in self._vertices and item2.name in self._vertices:
             v1 = self._vertices[item1.name]
-            return any(v2.location == item2 for v2 in v1.neighbours)
+            v2 = self._vertices[item2.name]
+            # once frozen this scans a tuple, which is cheap for the few calls made per trip and
+            # avoids keeping a set of neighbours for every vertex
+            return v2 in v1.neighbours
         else:
             return False
 
+    def freeze(self) -> None:
+        """Turn the neighbours of every vertex in this graph into a tuple, which is faster to
+        iterate over than a set, and record the locations of those neighbours.
+
+        Call this once the graph is fully built: no more edges can be added afterwards.
+        """
+        for v in self._vertices.values():
+            v.neighbours = tuple(v.neighbours)
+            v.neighbour_locations = tuple(u.location for u in v.neighbours)
+
+        self._frozen = True
+
+    def get_coordinates(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return two arrays holding the latitude and longitude of every vertex's location in
+        radians, in the order the vertices were added to this graph.
+        """
+        if self._coordinates is None:
+            self._coordinates = (np.array(self._latitudes), np.array(self._longitudes))
+
+        return self._coordinates
+
     def get_vertex_str(self, location: str) -> _Vertex:
         """Returns the vertex searched for.
         """
         return self._vertices[location]
 
-    def get_neighbors_str(self, location: str) -> set:
+    def get_neighbors_str(self, location: str) -> Union[set, tuple]:
         """Returns set of neighbors from given vertex
         """
         return self._vertices[location].neighbours
@@ -101,7 +159,7 @@ class Graph:
         """
         return self._vertices[location.name]
 
-    def get_neighbors(self, location: Location) -> set:
+    def get_neighbors(self, location: Location) -> Union[set, tuple]:
         """Returns set of neighbors from given vertex
         """
         return self._vertices[location.name].neighbours
@@ -137,49 +195,94 @@ class CityLocations(Graph):
 class SubwayLines(Graph):
     """A graph representing the city's subway network
 
+    Instance Attributes:
+        - route_cache: the shortest routes already found between two stations of this graph, keyed
+            on the (sorted) names of the two end stations. This is filled in by
+            find_path.find_subway_path.
+
     Representation Invariants:
         - all(isinstance(self._vertices[v].item, SubwayStation) for v in self._vertices)
     """
+    route_cache: dict[tuple[str, str], Optional[list[SubwayStation]]]
+
+    def __init__(self) -> None:
+        """Initialize an empty subway graph, with no routes found yet."""
+        super().__init__()
+        self.route_cache = {}
 
     def get_all_vertices(self) -> list:
         """Return a set of all Location objects of vertices in this graph.
         """
         return [v.location for v in self._vertices.values()]
 
+    def get_closest_station(self, location: Location) -> SubwayStation:
+        """Return the station in this graph that is closest to the given location.
+
+        Preconditions:
+            - self._vertices != {}
+        """
+        lats, lons = self.get_coordinates()
+        a = haversine_terms(location.lat_rad, location.lon_rad, lats, lons)
+
+        return self.get_all_vertices()[int(np.argmin(a))]
+
 
 def get_distance(l1: Location, l2: Location) -> float:
     """Return the distance in meters between two geographical locations.
 
+    See haversine for the formula used.
+    """
+    return haversine(l1.lat_rad, l1.lon_rad, l1.cos_lat, l2.lat_rad, l2.lon_rad, l2.cos_lat)
+
+
+def haversine(lat1: float, lon1: float, cos_lat1: float,
+              lat2: float, lon2: float, cos_lat2: float) -> float:
+    """Return the distance in meters between the geographical coordinates (lat1, lon1) and
+    (lat2, lon2), given in radians. cos_lat1 and cos_lat2 are the cosines of lat1 and lat2.
+
     This uses the haversine formula found here:
     https://www.movable-type.co.uk/scripts/latlong.html
     """
-    # geographical coordinates
-    lat1, lon1 = l1.location
-    lat2, lon2 = l2.location
+    a = math.sin((lat2 - lat1) / 2) ** 2 +\
+        cos_lat1 * cos_lat2 * (math.sin((lon2 - lon1) / 2) ** 2)
 
-    r = 6371000  # radius of the earth, in meters
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
-    # convert to radians
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
+    return EARTH_RADIUS * c
 
-    # change in lat/lon
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
 
-    # apply the formula
-    a = math.sin(delta_lat / 2) ** 2 +\
-        math.cos(lat1_rad) * math.cos(lat2_rad) * (math.sin(delta_lon / 2) ** 2)
+def haversine_terms(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Return the haversine term a between (lat, lon) and each of the coordinates in (lats, lons),
+    all given in radians.
+
+    a grows with the distance between the two points, so it can be used to rank locations by
+    distance without finishing the formula in haversine.
+    """
+    return np.sin((lats - lat) / 2) ** 2 + \
+        math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
 
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
-    d = r * c
+def load_all_graphs(landmarks_file: str, restaurants_file: str, subway_file: str,
+                    subway_lines_file: str, hotel: Hotel) -> tuple[CityLocations, SubwayLines]:
+    """Return the graph of locations in the city and the graph of its subway network.
 
-    return d
+    The subway stations are only read once, and the same SubwayStation objects are used as
+    vertices in both graphs. The exception is a station sharing its name with a landmark or
+    restaurant (e.g. 'Maison Blanche'): vertices are keyed by name, so the city graph keeps the
+    location added first and has no vertex for that station.
+
+    Preconditions:
+        - the files satisfy the preconditions of load_city_graph and load_subway_graph
+    """
+    subway_graph = load_subway_graph(subway_file, subway_lines_file)
+    city_graph = load_city_graph(landmarks_file, restaurants_file,
+                                 subway_graph.get_all_vertices(), hotel)
 
+    return (city_graph, subway_graph)
 
-def load_city_graph(landmarks_file: str, restaurants_file: str, subway_file: str, hotel: Hotel)\
-        -> CityLocations:
+
+def load_city_graph(landmarks_file: str, restaurants_file: str,
+                    subway_stations: list[SubwayStation], hotel: Hotel) -> CityLocations:
     """Return a graph representing the locations in the city.
 
     This will include all points of interest. However, only one hotel will be included: the one the
@@ -191,7 +294,7 @@ def load_city_graph(landmarks_file: str, restaurants_file: str, subway_file: str
         - hotel.staying is True
         - landmarks_file is the path to a CSV file corresponding to data about local attractions
         - restaurants_file is a path to a CSV file corresponding to data about restaurants
-        - subway_file is a path to a CSV file corresponding to data about subway stations
+        - subway_stations are the stations of the graph returned by load_subway_graph
     """
     # initialize the graph
     city_graph = CityLocations()
@@ -202,35 +305,94 @@ def load_city_graph(landmarks_file: str, restaurants_file: str, subway_file: str
     # add restaurant vertices
     add_restaurants(city_graph, restaurants_file)
 
-    with open(subway_file, encoding='utf-8') as subways:
-        # csv readers
-        subway_reader = csv.reader(subways)
-
-        # add subway vertices
-        for subway in subway_reader:
-            # indexes correspond to name and (lat, lon)
-            new_subway = SubwayStation(subway[1], (float(subway[2]), float(subway[3])))
-            city_graph.add_vertex(new_subway)
+    # add subway vertices, reusing the stations already loaded into the subway graph. A station
+    # named like a location added above is skipped by add_vertex
+    for subway in subway_stations:
+        city_graph.add_vertex(subway)
 
-        # add hotel
-        hotel.staying = True
-        city_graph.add_vertex(hotel)
-        city_graph.hotel = hotel
+    # add hotel
+    hotel.staying = True
+    city_graph.add_vertex(hotel)
+    city_graph.hotel = hotel
 
     # add edges
     print('Adding edges by geographical proximity....')
-    vertices = list(city_graph.get_all_vertices())
-    for i in range(0, len(vertices)):
-        for j in range(i + 1, len(vertices)):
-            assert vertices[i] != vertices[j]
+    vertices = city_graph.get_all_vertices()
+    lats, lons = city_graph.get_coordinates()
+    for rows, columns in get_close_pairs(lats, lons, 1500):
+        for i, j in zip(rows.tolist(), columns.tolist()):
+            city_graph.add_edge(vertices[i], vertices[j])
 
-            d = get_distance(vertices[i], vertices[j])
-            if d <= 1500:
-                city_graph.add_edge(vertices[i], vertices[j])
+    city_graph.freeze()
 
     return city_graph
 
 
+def get_close_pairs(lat: np.ndarray, lon: np.ndarray, max_distance: float)\
+        -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """Yield every pair of indices (i, j) with i < j such that the coordinates (lat[i], lon[i])
+    and (lat[j], lon[j]), given in radians, are at most max_distance meters apart.
+
+    The pairs are yielded one grid cell at a time, as two arrays holding the i and the j of each
+    pair, so the pairs of the whole city never have to be held at once.
+
+    The coordinates are first bucketed into a grid whose cells are at least max_distance wide,
+    so two close coordinates are always in the same or in neighbouring cells. Each cell is then
+    compared against the (up to) 9 cells around it with the same haversine formula as
+    get_distance, computed on numpy arrays. The cells are independent, so they are spread over a
+    thread pool (numpy releases the GIL while it works on the arrays).
+
+    Preconditions:
+        - len(lat) == len(lon)
+        - 0 < max_distance < math.pi * EARTH_RADIUS / 2
+        - all(abs(x) < math.pi / 2 for x in lat)
+        - no two close coordinates lie on opposite sides of the antimeridian
+    """
+    if len(lat) == 0:
+        return
+
+    cos_lat = np.cos(lat)
+
+    # d <= max_distance exactly when the haversine term a <= a_max, so the rest of the formula
+    # never needs to be computed
+    a_max = math.sin(max_distance / (2 * EARTH_RADIUS)) ** 2
+
+    # the largest change in latitude and in longitude two close coordinates can have
+    cell_height = max_distance / EARTH_RADIUS
+    cell_width = 2 * math.asin(min(1.0, math.sqrt(a_max) / float(np.min(cos_lat))))
+
+    # ACCUMULATOR: maps each grid cell to the indices of the coordinates in it
+    cells = defaultdict(list)
+    for i, cell in enumerate(zip(np.floor(lat / cell_height).astype(int).tolist(),
+                                 np.floor(lon / cell_width).astype(int).tolist())):
+        cells[cell].append(i)
+
+    # the coordinates in each cell, and the coordinates in the 3x3 block of cells around it
+    rows = [np.array(indices) for indices in cells.values()]
+    columns = [np.array([j for d_row in (-1, 0, 1) for d_column in (-1, 0, 1)
+                         for j in cells.get((row + d_row, column + d_column), [])])
+               for row, column in cells]
+
+    with ThreadPoolExecutor() as executor:
+        yield from executor.map(
+            lambda r, c: get_close_pairs_cell(lat, lon, cos_lat, a_max, r, c), rows, columns)
+
+
+def get_close_pairs_cell(lat: np.ndarray, lon: np.ndarray, cos_lat: np.ndarray, a_max: float,
+                         rows: np.ndarray, columns: np.ndarray) \
+        -> tuple[np.ndarray, np.ndarray]:
+    """Return every pair (i, j) with i in rows, j in columns and i < j such that the haversine
+    term a between coordinates i and j is at most a_max, as an array of each i and an array of
+    each j.
+    """
+    a = np.sin((lat[columns] - lat[rows, None]) / 2) ** 2 + \
+        cos_lat[rows, None] * cos_lat[columns] * np.sin((lon[columns] - lon[rows, None]) / 2) ** 2
+
+    # only keep each pair once
+    i, j = np.nonzero((a <= a_max) & (columns > rows[:, None]))
+    return (rows[i], columns[j])
+
+
 def add_attractions(city_graph: CityLocations, landmarks_file: str) -> None:
     """Adds landmarks from landmarks_file to the graph"""
     with open(landmarks_file, encoding='utf-8') as landmarks:
@@ -240,7 +402,7 @@ def add_attractions(city_graph: CityLocations, landmarks_file: str) -> None:
         # add landmark vertices
         print('Adding vertices....')
         for landmark in landmarks_reader:
-            operation_times = get_opening_times(landmark[8:22])
+            operation_times = get_opening_times(landmark, 8)
             new_landmark = Landmark(landmark[1], (float(landmark[5]), float(landmark[6])),
                                     operation_times, float(landmark[22]))
             city_graph.add_vertex(new_landmark)
@@ -254,27 +416,29 @@ def add_restaurants(city_graph: CityLocations, restaurants_file: str) -> None:
 
         # add restaurant vertices
         for restaurant in restaurants_reader:
-            opening_time = get_opening_times(restaurant[9:23])
+            opening_time = get_opening_times(restaurant, 9)
             new_restaurant = Restaurant(restaurant[1], (float(restaurant[5]), float(restaurant[6])),
                                         opening_time, int(restaurant[7]))
             city_graph.add_vertex(new_restaurant)
 
 
-def get_opening_times(times: list) -> dict:
-    """Adds the landmarks to the graph"""
-    # 1 = name, 5 = lat, 6 = lon, 8-21 = opening times (sun-open, sun-close,..), 22 = rating
+def get_opening_times(row: list[str], start: int) -> dict:
+    """Return the opening times stored in the 14 columns of row beginning at index start.
+
+    The columns are read in place as (sun-open, sun-close, mon-open, mon-close, ...), following
+    WEEK_DAYS, so the row does not need to be sliced first.
+    """
     operation_times = {}
-    days = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
 
-    for i in range(0, 7):
+    for i, day in enumerate(WEEK_DAYS):
+        opening = row[start + i * 2]
+        closing = row[start + i * 2 + 1]
 
-        if times[i * 2] == 'N/A':
-            operation_times[days[i]] = None
+        if opening == 'N/A':
+            operation_times[day] = None
         else:
-            operation_times[days[i]] = (time(hour=int(times[i * 2][:2]),
-                                             minute=int(times[i * 2][2:])),
-                                        time(hour=int(times[i * 2 + 1][:2]),
-                                             minute=int(times[i * 2 + 1][2:])))
+            operation_times[day] = (time(hour=int(opening[:2]), minute=int(opening[2:])),
+                                    time(hour=int(closing[:2]), minute=int(closing[2:])))
 
     return operation_times
 
@@ -297,15 +461,17 @@ def load_subway_graph(subway_file: str, subway_lines_file: str) -> SubwayLines:
         subway_reader = csv.reader(subways)
         lines_reader = csv.reader(lines)
 
-        ids_to_objects = {}  # accumulator
+        # subway[0] is the station_id; the ids are small and dense, so they index a list
+        subway_rows = [(int(subway[0]), subway) for subway in subway_reader]
+        ids_to_objects = [None] * (max(i for i, _ in subway_rows) + 1)  # accumulator
 
         # add vertices
-        for subway in subway_reader:
+        for station_id, subway in subway_rows:
             # indexes correspond to name and (lat, lon)
             new_subway = SubwayStation(subway[1], (float(subway[2]), float(subway[3])))
 
             subway_graph.add_vertex(new_subway)
-            ids_to_objects[int(subway[0])] = new_subway  # subway[0] is the station_id
+            ids_to_objects[station_id] = new_subway
 
         # add edges
         for row in lines_reader:
@@ -315,13 +481,16 @@ def load_subway_graph(subway_file: str, subway_lines_file: str) -> SubwayLines:
 
             subway_graph.add_edge(station1, station2)
 
+    subway_graph.freeze()
+
     return subway_graph
 
 
 if __name__ == "__main__":
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['location', 'datetime', 'math', 'csv'],
+        'extra-imports': ['location', 'datetime', 'math', 'csv', 'collections',
+                          'concurrent.futures', 'numpy'],
         'allowed-io': ['load_city_graph', 'load_subway_graph',
                        'add_attractions', 'add_restaurants'],
         'max-line-length': 100,
@@ -4,17 +4,31 @@ points of interest. This includes the Location class, as well as all its subclas
 This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
 """
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import datetime
+import math
+from typing import Optional
 
+# average time spent at each kind of location. timedelta is immutable, so these are shared by
+# every instance using the default
+LANDMARK_DEFAULT_TIME = datetime.timedelta(hours=2)
+RESTAURANT_DEFAULT_TIME = datetime.timedelta(hours=1)
+SUBWAY_DEFAULT_TIME = datetime.timedelta(minutes=5)
 
-@dataclass
+# the order of the days in opening_minutes. This matches the order of the columns in the data files
+WEEK_DAYS = ('Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')
+
+
+@dataclass(slots=True)
 class Location:
     """A point of interest. This could be a landmark, restaurant, subway station, etc.
 
     Instance Attributes:
         - name: the name of the location
         - location: the geographical location in (latitude, longitude)
+        - lat_rad: the latitude of this location in radians
+        - lon_rad: the longitude of this location in radians
+        - cos_lat: the cosine of lat_rad
 
     Representation Invariants:
         - -90 <= self.location[0] <= 90
@@ -22,9 +36,18 @@ class Location:
     """
     name: str
     location: tuple[float, float]
+    lat_rad: float = field(init=False, repr=False, compare=False)
+    lon_rad: float = field(init=False, repr=False, compare=False)
+    cos_lat: float = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        """Precompute the values used to find the distance between this location and another."""
+        self.lat_rad = math.radians(self.location[0])
+        self.lon_rad = math.radians(self.location[1])
+        self.cos_lat = math.cos(self.lat_rad)
 
 
-@dataclass
+@dataclass(slots=True)
 class Landmark(Location):
     """A historical landmark or popular form of entertainment in the city.
 
@@ -33,6 +56,8 @@ class Landmark(Location):
             for on that day. It only includes days the location is open on.
         - rating: the average rating given to this location by reviewers
         - time_spent: the average time spent at this location
+        - opening_minutes: the opening and closing time on each day of WEEK_DAYS, in minutes since
+            midnight. Days the location is closed on are stored as (-1, -1).
 
     Representation Invariants:
         - all(day in {'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',\
@@ -42,10 +67,16 @@ class Landmark(Location):
     """
     opening_times: dict[str, tuple[datetime.time, datetime.time]]
     rating: float
-    time_spent: datetime.timedelta = datetime.timedelta(hours=2)
+    time_spent: datetime.timedelta = LANDMARK_DEFAULT_TIME
+    opening_minutes: tuple[tuple[int, int], ...] = field(init=False, repr=False, compare=False)
 
+    def __post_init__(self) -> None:
+        """Precompute the distance values and the opening times in minutes."""
+        Location.__post_init__(self)
+        self.opening_minutes = pack_opening_times(self.opening_times)
 
-@dataclass
+
+@dataclass(slots=True)
 class Restaurant(Location):
     """A restaurant in the city
 
@@ -54,6 +85,8 @@ class Restaurant(Location):
             for on that day. It only includes days the location is open on.
         - rating: the average rating given to this location by reviewers
         - time_spent: the average time spent at this location
+        - opening_minutes: the opening and closing time on each day of WEEK_DAYS, in minutes since
+            midnight. Days the location is closed on are stored as (-1, -1).
 
     Representation Invariants:
         - all(day in {'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',\
@@ -63,10 +96,16 @@ class Restaurant(Location):
     """
     opening_times: dict[str, tuple[datetime.time, datetime.time]]
     rating: float
-    time_spent: datetime.timedelta = datetime.timedelta(hours=1)
+    time_spent: datetime.timedelta = RESTAURANT_DEFAULT_TIME
+    opening_minutes: tuple[tuple[int, int], ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        """Precompute the distance values and the opening times in minutes."""
+        Location.__post_init__(self)
+        self.opening_minutes = pack_opening_times(self.opening_times)
 
 
-@dataclass
+@dataclass(slots=True)
 class Hotel(Location):
     """A hotel in the city
 
@@ -76,7 +115,7 @@ class Hotel(Location):
     staying: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class SubwayStation(Location):
     """A subway station in the city
 
@@ -86,13 +125,32 @@ class SubwayStation(Location):
     Representation Invariants:
         - datetime.timedelta(0) <= self.time_spent <= datetime.timedelta(hours=24)
     """
-    time_spent: datetime.timedelta = datetime.timedelta(minutes=5)
+    time_spent: datetime.timedelta = SUBWAY_DEFAULT_TIME
+
+
+def pack_opening_times(opening_times: dict[str, Optional[tuple[datetime.time, datetime.time]]]) \
+        -> tuple[tuple[int, int], ...]:
+    """Return opening_times as (open, close) pairs of minutes since midnight, ordered by WEEK_DAYS.
+
+    Days missing from opening_times or mapped to None are closed and become (-1, -1), so no time
+    of day falls inside them.
+    """
+    packed = []
+    for day in WEEK_DAYS:
+        times = opening_times.get(day)
+        if times is None:
+            packed.append((-1, -1))
+        else:
+            packed.append((times[0].hour * 60 + times[0].minute,
+                           times[1].hour * 60 + times[1].minute))
+
+    return tuple(packed)
 
 
 if __name__ == "__main__":
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['dataclasses', 'datetime'],
+        'extra-imports': ['dataclasses', 'datetime', 'math', 'typing'],
         'allowed-io': [],  # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
         'disable': ['E1136']
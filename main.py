@@ -36,13 +36,11 @@ if __name__ == "__main__":
     return_time = user_input['return']
 
     # load graphs
-    print('Loading city graph....')
-    city_graph = graphs.load_city_graph('data/paris-attraction-final.csv',
-                                        'data/paris-restaurant-organized-final.csv',
-                                        'data/paris_metro_stations.csv', chosen_hotel)
-    print('Loading subway stations graph....')
-    subway_graph = graphs.load_subway_graph('data/paris_metro_stations.csv',
-                                            'data/paris_metro_lines.csv')
+    print('Loading city and subway stations graphs....')
+    city_graph, subway_graph = graphs.load_all_graphs('data/paris-attraction-final.csv',
+                                                      'data/paris-restaurant-organized-final.csv',
+                                                      'data/paris_metro_stations.csv',
+                                                      'data/paris_metro_lines.csv', chosen_hotel)
 
     # choose trip locations
     print('Choosing locations to visit....')
@@ -4,49 +4,90 @@ This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Bece
 """
 
 import tkinter
+from datetime import datetime
+from functools import lru_cache
+from itertools import chain
+from typing import Optional
 import numpy as np
-from matplotlib import image
 from matplotlib import pyplot as plt
+from matplotlib.artist import Artist
+from matplotlib.backend_bases import DrawEvent
+from matplotlib.collections import LineCollection
+from matplotlib.font_manager import findfont
+from PIL import Image, ImageDraw, ImageFont, ImageTk
 from schedule import TimeBlock
 from location import Location, SubwayStation, Restaurant
 
 
-COLORS = ['white', 'light grey', 'light green']
+# colour names understood by PIL, which draws the schedule
+COLORS = ['white', 'lightgrey', 'lightgreen']
+
+# the colour of a schedule slot and the suffix added to its name, by kind of location visited
+SLOT_STYLES = {SubwayStation: (COLORS[1], ' Station'), Restaurant: (COLORS[2], '')}
+DEFAULT_SLOT_STYLE = (COLORS[0], '')
+
+# the area of the city covered by map.jpg, as (west, east, south, north)
+MAP_BBOX = (2.1303, 2.4774, 48.7231, 48.9942)
 
 
 def print_schedule(schedule: list[TimeBlock], win: tkinter.Canvas) -> None:
     """Creates a slot for every location, holding the time range and the 
     name of the location.
+
+    The slots are drawn into a single image, which is added to win as one canvas item however long
+    the schedule is.
     """
     x_value = 0
     y_value = 0
     space = 25
 
+    img = Image.new('RGB', (500, max(len(schedule) * space, 1)), COLORS[0])
+    draw = ImageDraw.Draw(img)
+
     for timeblock in schedule:
-        name = timeblock.location_visited.name
-        start = timeblock.start_time.strftime("%H:%M:%S")
-        end = timeblock.end_time.strftime("%H:%M:%S")
-        if isinstance(timeblock.location_visited, SubwayStation):
-            name += ' Station'
-            color = COLORS[1]
-        elif isinstance(timeblock.location_visited, Restaurant):
-            color = COLORS[2]
-        else:
-            color = COLORS[0]
-        rectangle((x_value, y_value), space, color, win, (name, start, end))
+        color, suffix = SLOT_STYLES.get(type(timeblock.location_visited), DEFAULT_SLOT_STYLE)
+        name = timeblock.location_visited.name + suffix
+        start = format_time(timeblock.start_time)
+        end = format_time(timeblock.end_time)
+        rectangle((x_value, y_value), space, color, draw, (name, start, end))
         y_value += space
 
+    photo = ImageTk.PhotoImage(img)
+    win.create_image(0, 0, image=photo, anchor='nw')
+    # tkinter does not keep a reference to the image, so it would be freed once this returns
+    win.schedule_image = photo
+
+
+def format_time(moment: datetime) -> str:
+    """Return the time of day of moment as HH:MM:SS.
+
+    This gives the same result as moment.strftime("%H:%M:%S"), without parsing a format string.
+    """
+    return f'{moment.hour:02d}:{moment.minute:02d}:{moment.second:02d}'
+
 
 def rectangle(point: tuple[int, int], space: int, color: str,
-              window: tkinter, timeblock_info: tuple[str, str, str]) -> None:
-    """Creates a rectangle on a tkinter object with the specified parameters.
+              draw: ImageDraw.ImageDraw, timeblock_info: tuple[str, str, str]) -> None:
+    """Draws a rectangle holding the time range and name of a slot with the specified parameters.
     """
     x, y = point
     name, start, end = timeblock_info
 
-    window.create_rectangle(x, y, x + 500, y + space, fill=color)
-    window.create_text((x + 300, y + space / 2), text=name)
-    window.create_text((x + 60, y + space / 2), text=start + ' to ' + end)
+    bottom = y + space
+    middle = y + space * 0.5
+
+    draw.rectangle((x, y, x + 500, bottom), fill=color, outline='black')
+    draw.text((x + 5, middle), f'{start} to {end}    {name}', fill='black',
+              font=load_schedule_font(), anchor='lm')
+
+
+@lru_cache(maxsize=1)
+def load_schedule_font() -> ImageFont.FreeTypeFont:
+    """Return the font the schedule is written in.
+
+    This is matplotlib's default font, which covers far more characters than PIL's built-in one.
+    """
+    return ImageFont.truetype(findfont('DejaVu Sans'), 12)
 
 
 def open_window_schedule(schedule: list[TimeBlock]) -> None:
@@ -56,41 +97,165 @@ def open_window_schedule(schedule: list[TimeBlock]) -> None:
     mywin.pack()
 
     print_schedule(schedule, mywin)
+    mywin.update_idletasks()
     window.title("Today's Schedule")
     window.geometry("500x" + str(len(schedule) * 25) + "+10+10")
     window.mainloop()
 
 
+class PathPlot:
+    """A figure showing a path over the map of the city, redrawn with blitting.
+
+    The map and axes are drawn normally, while the path itself (its legs, points and labels) is
+    made of animated artists drawn on top of them. Every full draw of the figure saves what was
+    drawn before the path as a background, so the path can be redrawn later by restoring that
+    background instead of rendering the map again.
+
+    Instance Attributes:
+        - fig: the figure the path is drawn in
+        - ax: the axes the map and path are drawn on
+        - path_artists: the animated artists that make up the path
+        - background: the figure as drawn without the path, or None if it is not available
+    """
+    fig: plt.Figure
+    ax: plt.Axes
+    path_artists: list[Artist]
+    background: Optional[object]
+
+    def __init__(self) -> None:
+        """Initialize a new figure showing the map, with no path drawn on it."""
+        self.fig, self.ax = plt.subplots()
+        self.path_artists = []
+        self.background = None
+
+        # a lambda (rather than the bound method) keeps this object alive as long as the figure
+        self.fig.canvas.mpl_connect('draw_event', lambda event: self.on_draw(event))
+
+        self.ax.set_title('Path for Today')
+        self.ax.set_xlim(MAP_BBOX[0], MAP_BBOX[1])
+        self.ax.set_ylim(MAP_BBOX[2], MAP_BBOX[3])
+        self.ax.imshow(load_map(), zorder=0, extent=MAP_BBOX, aspect='equal')
+
+    def is_open(self) -> bool:
+        """Return whether the figure is still open, i.e. its window has not been closed."""
+        return plt.fignum_exists(self.fig.number)
+
+    def clear_path(self) -> None:
+        """Remove the path from the figure, keeping the map and the saved background."""
+        for artist in self.path_artists:
+            artist.remove()
+        self.path_artists = []
+
+    def on_draw(self, event: DrawEvent) -> None:
+        """Save the freshly drawn background, then draw the path on top of it.
+
+        Draws made while saving the figure to a file may use another dpi than the canvas, so no
+        background is saved for them, and the path is redrawn in full next time instead.
+        """
+        if event.canvas.is_saving():
+            self.background = None
+        elif event.canvas.supports_blit:
+            self.background = event.canvas.copy_from_bbox(self.fig.bbox)
+
+        for artist in sorted(self.path_artists, key=lambda a: a.get_zorder()):
+            artist.draw(event.renderer)
+
+    def redraw_path(self) -> None:
+        """Redraw only the path, on top of the saved background."""
+        canvas = self.fig.canvas
+
+        if self.background is None:
+            canvas.draw_idle()
+        else:
+            canvas.restore_region(self.background)
+            for artist in sorted(self.path_artists, key=lambda a: a.get_zorder()):
+                self.fig.draw_artist(artist)
+            canvas.blit(self.fig.bbox)
+            canvas.flush_events()
+
+
+@lru_cache(maxsize=1)
+def load_map() -> np.ndarray:
+    """Return the decoded background map of the city.
+
+    The image is only decoded the first time this is called, and the same read-only array is
+    returned afterwards. It is shrunk to the size it is shown at on the axes of a default-sized
+    figure, so imshow has fewer pixels to resample every time the figure is drawn.
+    """
+    with Image.open('map.jpg') as img:
+        params = plt.rcParams
+        fig_width, fig_height = params['figure.figsize']
+        axes_width = fig_width * params['figure.dpi'] * (params['figure.subplot.right']
+                                                         - params['figure.subplot.left'])
+        axes_height = fig_height * params['figure.dpi'] * (params['figure.subplot.top']
+                                                           - params['figure.subplot.bottom'])
+        # the map is stretched over MAP_BBOX with equal axis scales, so it is shown with the aspect
+        # ratio of MAP_BBOX rather than its own
+        aspect = (MAP_BBOX[1] - MAP_BBOX[0]) / (MAP_BBOX[3] - MAP_BBOX[2])
+        shown_height = min(axes_height, axes_width / aspect)
+
+        # never enlarge the map, which would only add pixels to resample
+        size = (min(round(shown_height * aspect), img.width), min(round(shown_height), img.height))
+        if size != img.size:
+            img = img.resize(size, Image.LANCZOS)
+
+        ruh_m = np.asarray(img)
+
+    ruh_m.flags.writeable = False
+    return ruh_m
+
+
+# the figure used by show_path. It is created on the first call, then reused while it is open
+_PATH_PLOT: Optional[PathPlot] = None
+
+
 def show_path(path: list[Location]) -> None:
     """Opens a window that allows the user to see the path they have to take.
+
+    The same figure is reused for every path shown while its window stays open: only the previous
+    path is replaced, and the map behind it is not drawn again.
     """
+    global _PATH_PLOT
+
+    if _PATH_PLOT is None or not _PATH_PLOT.is_open():
+        _PATH_PLOT = PathPlot()
+    plot = _PATH_PLOT
+    plot.clear_path()
+    ax = plot.ax
+
+    # fill the coordinates straight from a flat stream of (lat, lon) values, so numpy never has to
+    # assign a row at a time
+    coordinates = np.fromiter(chain.from_iterable(location.location for location in path),
+                              dtype=np.float64, count=2 * len(path)).reshape(-1, 2)
+    n = [location.name for location in path]
 
-    bbox = (2.1303, 2.4774, 48.7231, 48.9942)
-    ruh_m = image.imread('map.jpg')
-    fig, ax = plt.subplots()
+    y = coordinates[:, 0]
+    x = coordinates[:, 1]
 
-    y = np.array([location.location[0] for location in path])
-    x = np.array([location.location[1] for location in path])
-    n = np.array([location.name for location in path])
-    sizes = np.array([10])
+    # every point shares one size and colour, so a marker-only line can stamp a single marker
+    plot.path_artists.extend(ax.plot(x, y, 'o', linestyle='None', markersize=np.sqrt(10),
+                                     markeredgecolor='red', markerfacecolor='red',
+                                     animated=True))
 
-    ax.scatter(x, y, s=sizes, color='red')
+    for x_i, y_i, txt in zip(x, y, n):
+        plot.path_artists.append(ax.text(x_i, y_i, txt, clip_on=True, animated=True))
 
-    for i, txt in enumerate(n):
-        ax.annotate(txt, (x[i], y[i]))
-    for i in range(0, len(x) - 1):
-        ax.plot([x[i], x[i + 1]], [y[i], y[i + 1]])
+    # draw every leg of the path as one artist, keeping the colour cycle ax.plot would have used
+    points = coordinates[:, ::-1]  # (x, y) = (lon, lat), as a view of coordinates
+    segments = np.stack([points[:-1], points[1:]], axis=1)
+    cycle = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    colors = [cycle[i % len(cycle)] for i in range(len(segments))]
+    plot.path_artists.append(ax.add_collection(LineCollection(segments, colors=colors,
+                                                              linewidths=1.5, animated=True)))
 
-    ax.set_title('Path for Today')
-    ax.set_xlim(bbox[0], bbox[1])
-    ax.set_ylim(bbox[2], bbox[3])
-    ax.imshow(ruh_m, zorder=0, extent=bbox, aspect='equal')
+    plot.redraw_path()
 
 
 if __name__ == "__main__":
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['tkinter', 'schedule', 'location', 'numpy', 'matplotlib'],
+        'extra-imports': ['tkinter', 'datetime', 'functools', 'itertools', 'typing', 'schedule',
+                          'location', 'numpy', 'matplotlib', 'PIL'],
         'allowed-io': [],  # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
         'disable': ['E1136']